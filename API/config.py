@@ -5,6 +5,9 @@ class Settings(BaseSettings):
     # DB
     DATABASE_URL: str
     PG_STATEMENT_TIMEOUT_MS: int = 3
+    PG_POOL_MIN_SIZE: int = 5
+    PG_POOL_MAX_SIZE: int = 15
+    PG_POOL_TIMEOUT_S: float = 30.0  # max wait for a free connection
     # LLM
 
     LLM_PROVIDER: str = "openai"  # ollama | openai
@@ -18,6 +21,12 @@ class Settings(BaseSettings):
     DEFAULT_TEMPERATURE: float = 0.6
     OLLAMA_BASE_URL: str = "http://127.0.0.1:11434"
 
+    # SQL generation micro-batching: requests arriving within the window share one LLM call (0 = off)
+    SQL_GEN_BATCH_WINDOW_MS: int = 0
+    SQL_GEN_BATCH_MAX_SIZE: int = 8
+    # request a "more selective" SQL fix while the query is still running (used on timeout)
+    SQL_SPECULATIVE_FIX: bool = False
+
     # RAG SERVICE
     RAGDB_URL: str = "http://127.0.0.1:9000"
 
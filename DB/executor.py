@@ -1,10 +1,13 @@
 import re
 import logging
-from typing import Dict, Any, List
+import threading
+from contextlib import nullcontext
+from typing import Dict, Any, List, Optional
 
 import psycopg
 from psycopg.rows import dict_row
 from psycopg.errors import QueryCanceled
+from psycopg_pool import ConnectionPool
 
 from API.config import settings
 from DB.format_pg_error import format_pg_error
@@ -14,10 +17,85 @@ class DBTimeoutError(RuntimeError):
     pass
 
 
-def run_sql(sql: str, limit: int = 10) -> List[Dict[str, Any]]:
+class DBCancelledError(RuntimeError):
+    pass
+
+
+class QueryCancel:
+    """
+    Handle for aborting a run_sql call from another thread.
+
+    cancel() sends a server-side cancel for the running query, so the worker
+    thread and its pool connection are released right away. If the query has
+    not started yet, run_sql skips it. cancel() blocks on the network:
+    call it from a worker thread, not from the event loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._conn: Optional[psycopg.Connection] = None
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except Exception:
+                    logging.getLogger("orchestrator").debug("Query cancel failed", exc_info=True)
+
+    def _attach(self, conn: psycopg.Connection) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._conn = conn
+            return True
+
+    def _detach(self) -> None:
+        # under the lock: a cancel must not reach the connection once it is back in the pool
+        with self._lock:
+            self._conn = None
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def open_pool() -> ConnectionPool:
+    """
+    Opens the process-wide connection pool (idempotent). Called on app startup;
+    run_sql also opens it lazily. Connections are established in the background.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                settings.DATABASE_URL,
+                min_size=settings.PG_POOL_MIN_SIZE,
+                max_size=settings.PG_POOL_MAX_SIZE,
+                timeout=settings.PG_POOL_TIMEOUT_S,
+                open=False,
+            )
+            _pool.open()
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def run_sql(sql: str, limit: int = 10, cancel: Optional[QueryCancel] = None) -> List[Dict[str, Any]]:
     """
     Executes a SELECT query with a hard statement_timeout and an enforced LIMIT
     (added if missing). Returns a list of dicts.
+
+    If `cancel` is given, cancel.cancel() aborts the query on the server and
+    run_sql raises DBCancelledError.
     """
     logger = logging.getLogger("orchestrator")
 
@@ -32,17 +110,33 @@ def run_sql(sql: str, limit: int = 10) -> List[Dict[str, Any]]:
     logger.debug("statement_timeout_ms=%s", settings.PG_STATEMENT_TIMEOUT_MS)
 
     try:
-        with psycopg.connect(settings.DATABASE_URL, row_factory=dict_row) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT set_config('statement_timeout', %s, true);",
-                    (str(int(settings.PG_STATEMENT_TIMEOUT_MS)),)
-                )
-                cur.execute(sql_clean)
-                rows = list(cur.fetchall())
-                return rows
+        # warm connection from the pool; waits up to PG_POOL_TIMEOUT_S when all are busy
+        with open_pool().connection() as conn:
+            if cancel is not None and not cancel._attach(conn):
+                raise DBCancelledError("Query cancelled before it started.")
+            try:
+                # pipeline: set_config + query go out in one round trip
+                pipeline = conn.pipeline() if psycopg.Pipeline.is_supported() else nullcontext()
+                with pipeline, conn.cursor(row_factory=dict_row) as cur:
+                    # set_config(..., true) is transaction-local: nothing leaks back into the pool
+                    conn.execute(
+                        "SELECT set_config('statement_timeout', %s, true);",
+                        (str(int(settings.PG_STATEMENT_TIMEOUT_MS)),)
+                    )
+                    cur.execute(sql_clean)
+                    rows = list(cur.fetchall())
+                    return rows
+            finally:
+                if cancel is not None:
+                    cancel._detach()
+
+    except DBCancelledError:
+        raise
 
     except QueryCanceled as e:
+        if cancel is not None and cancel.cancelled:
+            logger.info("SQL query cancelled by caller")
+            raise DBCancelledError(format_pg_error(e)) from e
         logger.warning(
             "SQL execution timed out (statement_timeout_ms=%s). Error: %s",
             settings.PG_STATEMENT_TIMEOUT_MS,
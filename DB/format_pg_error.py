@@ -1,6 +1,20 @@
+from typing import Optional, Tuple
+
 from psycopg.errors import Error as PsycopgError
 
 
+def pg_sqlstate(e: BaseException) -> Optional[str]:
+    """
+    SQLSTATE of a psycopg error, also when it is wrapped (e.g. DBTimeoutError
+    raised `from` QueryCanceled). None for non-database errors.
+    """
+    while e is not None:
+        if isinstance(e, PsycopgError) and getattr(e, "sqlstate", None):
+            return e.sqlstate
+        e = e.__cause__
+    return None
+
+
 def format_pg_error(e: Exception) -> str:
     """
     Extract detailed, human-readable PostgreSQL error information.
@@ -37,3 +51,11 @@ def format_pg_error(e: Exception) -> str:
         return " | ".join(parts)
 
     return str(e)
+
+
+def format_pg_error_with_sqlstate(e: Exception) -> Tuple[str, Optional[str]]:
+    """
+    Same as format_pg_error, plus the SQLSTATE so callers can classify the
+    error without parsing the text.
+    """
+    return format_pg_error(e), pg_sqlstate(e)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+logger = logging.getLogger("orchestrator")
+
+
+class LLMBatcher(Generic[T, R]):
+    """
+    Micro-batcher: collects items submitted within `window_s` and hands them
+    to `run_batch` as one list (e.g. one LLM call for several requests).
+
+    `run_batch` must return one result per item, in order; a result that is
+    an exception is raised to that item's caller only.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[T]], Awaitable[List[Any]]],
+        *,
+        window_s: float = 0.02,
+        max_batch: int = 8,
+    ):
+        self._run_batch = run_batch
+        self._window_s = window_s
+        self._max_batch = max_batch
+        self._queue: List[Tuple[T, asyncio.Future]] = []
+        self._loop_task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()  # strong refs to running batches
+
+    async def submit(self, item: T) -> R:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append((item, fut))
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._collect())
+        return await fut
+
+    async def _collect(self) -> None:
+        while self._queue:
+            await asyncio.sleep(self._window_s)
+            batch = self._queue[: self._max_batch]
+            del self._queue[: self._max_batch]
+            # dispatch in the background: the next window collects meanwhile
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            results = await self._run_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.warning("LLM batch of %d failed: %s", len(batch), e)
+            results = [e] * len(batch)
+
+        for (_, fut), res in zip(batch, results):
+            if fut.done():  # caller was cancelled
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
@@ -0,0 +1,290 @@
+"""
+Pure-Python SQL/text helpers used on every retry of the SQL pipeline.
+
+The module is kept free of LangChain/async code and fully annotated so it can
+be compiled to a C extension with mypyc (`mypyc LLM/sql_helpers.py`, see the
+Dockerfile). When the compiled module is present Python imports it instead of
+this file; otherwise this source is used as is.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, TypedDict
+
+logger = logging.getLogger("orchestrator")
+
+
+_LEADS_RE = re.compile(r"^\s*(?:select|with)\b", re.IGNORECASE)
+_BANNED_RE = re.compile(
+    r"\b(?:insert|update|delete|drop|alter|create|truncate|grant|revoke)\b",
+    re.IGNORECASE,
+)
+
+
+try:  # optional: Hyperscan scans all banned keywords in one SIMD pass
+    import hyperscan  # type: ignore[import-not-found]
+except ImportError:
+    hyperscan = None  # type: ignore[assignment]
+
+_BANNED_HS: Optional[Any] = None
+if hyperscan is not None:
+    try:
+        _BANNED_HS = hyperscan.Database()
+        _BANNED_HS.compile(
+            expressions=[_BANNED_RE.pattern.encode()],
+            ids=[0],
+            elements=1,
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8],
+        )
+    except Exception:
+        logger.warning("Hyperscan is installed but failed to compile; using re", exc_info=True)
+        _BANNED_HS = None
+
+
+def _stop_on_match(*_args: Any) -> bool:
+    return True  # terminate the scan on the first match
+
+
+def _has_banned_keyword(sql: str) -> bool:
+    if _BANNED_HS is not None:
+        try:
+            _BANNED_HS.scan(sql.encode("utf-8"), match_event_handler=_stop_on_match)
+            return False
+        except hyperscan.ScanTerminated:
+            # without UCP Hyperscan's \b sees non-ASCII letters as non-word
+            # ('éinsert'), so it matches a superset of re: confirm with re
+            pass
+        except hyperscan.HyperscanError:
+            pass  # e.g. scratch in use by another thread
+    return _BANNED_RE.search(sql) is not None
+
+
+def _is_select_only(sql: str) -> bool:
+    return bool(_LEADS_RE.match(sql)) and not _has_banned_keyword(sql)
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _sql_fingerprint(sql: str) -> bytes:
+    # case/whitespace-insensitive identity of an SQL text
+    normalized = _WS_RE.sub(" ", sql.strip().lower())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class _JsonObjectScanner:
+    """
+    Incremental brace-depth scanner. Finds the first complete top-level JSON
+    object in text fed chunk by chunk; braces inside JSON strings are ignored.
+    """
+
+    __slots__ = ("start", "end", "_pos", "_depth", "_in_str", "_escape")
+
+    def __init__(self) -> None:
+        self.start = -1
+        self.end = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """Returns True once the object is closed (`start`/`end` index the text fed so far)."""
+        if self.end != -1:
+            return True
+        for i, ch in enumerate(chunk, start=self._pos):
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == "{":
+                if self._depth == 0:
+                    self.start = i
+                self._depth += 1
+            elif self._depth == 0:
+                continue  # prose before the object: quotes here are not JSON strings
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i
+                    return True
+        self._pos += len(chunk)
+        return False
+
+
+def _extract_json(text: str) -> str:
+    """
+    Returns the first complete top-level JSON object in `text`; markdown fences,
+    prose and any further objects around it are skipped. Single O(n) pass.
+    """
+    text = (text or "").strip()
+
+    scanner = _JsonObjectScanner()
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end + 1]
+
+    # unbalanced (e.g. truncated output): let the JSON parser report the error
+    return text[scanner.start:] if scanner.start != -1 else text
+
+
+class Attempt(TypedDict, total=False):
+    sql: str
+    error: str
+    error_type: str
+    fix_notes: str
+
+
+def classify_error(err: str) -> str:
+    # plain `in` checks on one lower-cased copy: faster than a keyword regex here
+    e = (err or "").lower()
+
+    # timeout (also "statement timeout", "canceling statement due to statement timeout")
+    if "timeout" in e:
+        return "timeout"
+
+    # common postgres-ish
+    if "does not exist" in e and "column" in e:
+        return "missing_column"
+    if "does not exist" in e and ("relation" in e or "table" in e):
+        return "missing_table"
+    if "syntax error" in e:
+        return "syntax"
+    if "invalid input syntax" in e or "cannot cast" in e or "type mismatch" in e:
+        return "type"
+    if "permission denied" in e:
+        return "permission"
+
+    return "other"
+
+
+# Blocks/lines are memoized per attempt: each retry re-renders the whole
+# history, but only the newest attempt actually needs formatting.
+@lru_cache(maxsize=256)
+def _attempt_block(
+    i: int,
+    sql: str,
+    err: str,
+    et: str,
+    notes: str,
+    max_sql_chars: int,
+    max_err_chars: int,
+    max_notes_chars: int,
+) -> str:
+    block = (
+        f"ATTEMPT #{i}\n"
+        f"ERROR_TYPE: {et}\n"
+        f"SQL:\n{sql[:max_sql_chars]}\n\n"
+        f"ERROR:\n{err[:max_err_chars]}\n"
+    )
+    if notes:
+        block += f"\nFIX_NOTES:\n{notes[:max_notes_chars]}\n"
+    return block
+
+
+@lru_cache(maxsize=256)
+def _attempt_summary_line(i: int, et: str, err: str) -> str:
+    err = err.replace("\n", " ").strip()
+    if len(err) > 140:
+        err = err[:140] + "…"
+    return f"- #{i}: {et} | {err}"
+
+
+def build_attempts_transcript(
+    attempts: List[Attempt],
+    *,
+    max_items: int = 5,
+    max_sql_chars: int = 1400,
+    max_err_chars: int = 800,
+    max_notes_chars: int = 600,
+) -> str:
+    """
+    Compact transcript to feed the LLM. Uses only last `max_items` attempts.
+    """
+    if not attempts:
+        return "(none)"
+
+    tail = attempts[-max_items:]
+    start_idx = len(attempts) - len(tail) + 1
+
+    return "\n\n---\n\n".join(
+        _attempt_block(
+            i,
+            a.get("sql") or "",
+            a.get("error") or "",
+            a.get("error_type") or "unknown",
+            a.get("fix_notes") or "",
+            max_sql_chars,
+            max_err_chars,
+            max_notes_chars,
+        )
+        for i, a in enumerate(tail, start=start_idx)
+    )
+
+
+def build_attempts_summary(attempts: List[Attempt], *, max_items: int = 10) -> str:
+    """
+    Very short summary, good to include along transcript to reduce repetition.
+    """
+    if not attempts:
+        return "(none)"
+
+    tail = attempts[-max_items:]
+    start_idx = len(attempts) - len(tail) + 1
+
+    return "\n".join(
+        _attempt_summary_line(i, a.get("error_type") or "unknown", a.get("error") or "")
+        for i, a in enumerate(tail, start=start_idx)
+    )
+
+_SCHEMA_DOT_TABLE_IN_QUOTES = re.compile(
+    r'"([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)"',  # "public.FlightSchedules"
+    re.ASCII,
+)
+
+def fix_quoted_schema_table(sql: str) -> str:
+    # "public.FlightSchedules" -> "public"."FlightSchedules"
+    return _SCHEMA_DOT_TABLE_IN_QUOTES.sub(r'"\1"."\2"', sql)
+
+
+_FIXABLE_SQLSTATE_CLASSES = {
+    "42",  # syntax error, undefined table/column
+    "22",  # invalid input / type mismatch
+    "23",  # constraint violation
+}
+
+# SQLSTATE -> error_type: exact code first, then the 2-char class
+_SQLSTATE_MAP = {
+    "42P01": "missing_table",   # undefined_table
+    "42703": "missing_column",  # undefined_column
+    "42601": "syntax",          # syntax_error
+    "42804": "type",            # datatype_mismatch
+    "42846": "type",            # cannot_coerce
+    "42501": "permission",      # insufficient_privilege
+    "57014": "timeout",         # query_canceled (statement_timeout)
+    "42": "syntax",
+    "22": "type",
+    "23": "constraint",
+}
+
+_FIXABLE_ERROR_TYPES = {"missing_column", "missing_table", "syntax", "type"}
+
+
+def categorize_error(err: str, state: Optional[str]) -> Tuple[str, bool]:
+    """
+    Returns (error_type, llm_fixable). Uses the SQLSTATE when the driver gave
+    one; only errors without it fall back to scanning the text `err`.
+    """
+    if state:
+        et = _SQLSTATE_MAP.get(state) or _SQLSTATE_MAP.get(state[:2], "other")
+        return et, state[:2] in _FIXABLE_SQLSTATE_CLASSES
+
+    et = classify_error(err)
+    return et, et in _FIXABLE_ERROR_TYPES
@@ -1,72 +1,208 @@
 from __future__ import annotations
-from langchain_core.messages import SystemMessage, HumanMessage
-from DB.executor import run_sql, DBTimeoutError
-from prompts.sql_generator import SQL_GENERATOR_PROMPT
+from DB.executor import run_sql, DBTimeoutError, QueryCancel
+from prompts.sql_generator import SQL_GENERATOR_PROMPT, SQL_BATCH_GENERATOR_PROMPT
 from prompts.sql_fixer import SQL_FIXER_PROMPT
-from langchain_core.language_models import BaseChatModel
-import re
-import json
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import aclosing
+import hashlib
+import orjson
 from psycopg.errors import Error as PsycopgError
-from DB.format_pg_error import format_pg_error
-from typing import Any, Dict, List, TypedDict, Optional
-
-
-
-
+from DB.format_pg_error import format_pg_error_with_sqlstate
+from API.config import settings
+from LLM.batcher import LLMBatcher
+from LLM.sql_helpers import (
+    Attempt,
+    _FIXABLE_SQLSTATE_CLASSES,
+    _JsonObjectScanner,
+    _extract_json,
+    _is_select_only,
+    _sql_fingerprint,
+    build_attempts_summary,
+    build_attempts_transcript,
+    categorize_error,
+    classify_error,  # noqa: F401  (re-exported)
+    fix_quoted_schema_table,
+)
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-def _is_select_only(sql: str) -> bool:
-    s = sql.strip().lower()
-    if not (s.startswith("select") or s.startswith("with")):
-        return False
-    banned = ["insert", "update", "delete", "drop", "alter", "create", "truncate", "grant", "revoke"]
-    return not any(re.search(rf"\b{b}\b", s) for b in banned)
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
 
+# Messages are passed as LangChain ("role", content) tuples, which every chat
+# model accepts; this module never has to import langchain at runtime.
 
-def _extract_json(text: str) -> str:
-    text = (text or "").strip()
+logger = logging.getLogger("orchestrator")
 
-    # remove markdown fences if present
-    if text.startswith("```"):
-        text = text.split("```", 1)[1]
-        text = text.rsplit("```", 1)[0]
+# Prompt variations for speculative fixes: each concurrent fixer call gets
+# its own strategy so the candidates don't collapse into the same SQL.
+_FIX_STRATEGIES = (
+    "Be more selective: add filters and narrow the time range.",
+    "Simplify joins: drop every table that is not strictly required.",
+    "Add index-friendly filters: compare raw columns, avoid functions on filtered columns.",
+)
 
-    # fallback: extract first JSON object
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return text[start:end + 1]
 
-    return text
+async def _astream_json(llm: BaseChatModel, messages: List[Tuple[str, str]]) -> str:
+    """
+    Streams the completion and stops reading as soon as the first JSON object
+    is closed, so trailing tokens (commentary, closing fences) are not awaited.
+    """
+    scanner = _JsonObjectScanner()
+    parts: List[str] = []
+    async with aclosing(llm.astream(messages)) as stream:
+        async for chunk in stream:
+            text = chunk.content if isinstance(chunk.content, str) else ""
+            parts.append(text)
+            if scanner.feed(text):
+                break
+    return "".join(parts)
+
+
+def _canonical_json(obj: Any) -> str:
+    # stable key order: same schema -> same bytes (cache key + provider prompt-prefix cache)
+    return orjson.dumps(
+        obj,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str,
+    ).decode("utf-8")
+
+
+def _llm_cache_id(llm: Any) -> str:
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+    return f"{type(llm).__name__}:{model}:{getattr(llm, 'temperature', None)}"
+
+
+# user request -> SQL that already executed successfully (LRU).
+# Filled by execute_with_retries only after a successful run.
+_GEN_CACHE_MAX = 512
+_GEN_CACHE: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+
+
+def _gen_cache_key(llm: Any, user_text: str, schema_json: str) -> Tuple[str, str, str]:
+    return (
+        _llm_cache_id(llm),
+        user_text,
+        hashlib.blake2b(schema_json.encode("utf-8"), digest_size=16).hexdigest(),
+    )
 
 
 async def _llm_generate(
     llm: BaseChatModel,
     user_text: str,
     schema_context: Dict[str, Any],
+    *,
+    schema_json: Optional[str] = None,
 ) -> Dict[str, Any]:
-    res = await llm.ainvoke([
-        SystemMessage(content=SQL_GENERATOR_PROMPT),
-        HumanMessage(
-            content=(
-                "User request:\n"
-                f"{user_text}\n\n"
-                "schema_context:\n"
-                f"{json.dumps(schema_context, ensure_ascii=False)}"
-            )
+    """
+    Generates SQL for the request. With SQL_GEN_BATCH_WINDOW_MS > 0,
+    concurrent requests are micro-batched.
+    """
+    if schema_json is None:
+        schema_json = _canonical_json(schema_context)
+
+    if settings.SQL_GEN_BATCH_WINDOW_MS > 0:
+        return await _get_gen_batcher(llm).submit((llm, user_text, schema_json))
+    return await _llm_generate_one(llm, user_text, schema_json)
+
+
+async def _llm_generate_one(llm: BaseChatModel, user_text: str, schema_json: str) -> Dict[str, Any]:
+    # schema first, user request last: keeps the long stable part as the prompt prefix
+    raw = await _astream_json(llm, [
+        ("system", SQL_GENERATOR_PROMPT),
+        (
+            "human",
+            "schema_context:\n"
+            f"{schema_json}\n\n"
+            "User request:\n"
+            f"{user_text}",
         ),
     ])
 
-    raw = (res.content or "").strip()
+    raw = raw.strip()
     clean = _extract_json(raw)
 
     try:
-        return json.loads(clean)
-    except json.JSONDecodeError as e:
+        return orjson.loads(clean)
+    except orjson.JSONDecodeError as e:
         raise ValueError(
             f"SQL generator returned invalid JSON.\nRaw:\n{raw}"
         ) from e
 
 
+_GenItem = Tuple[Any, str, str]  # (llm, user_text, schema_json)
+
+
+async def _llm_generate_batch(items: List[_GenItem]) -> List[Any]:
+    """
+    One LLM call for several independent generation requests. Each distinct
+    schema is sent once and referenced by index. Falls back to one call per
+    request if the batched answer can't be used.
+    """
+    llm = items[0][0]
+    if len(items) == 1:
+        return [await _llm_generate_one(*items[0])]
+
+    schema_idx: Dict[str, int] = {}
+    batch_requests: List[Dict[str, Any]] = []
+    for i, (_, user_text, schema_json) in enumerate(items):
+        batch_requests.append({
+            "idx": i,
+            "schema_idx": schema_idx.setdefault(schema_json, len(schema_idx)),
+            "request": user_text,
+        })
+    schemas_block = "\n\n".join(f"schema_context #{i}:\n{sj}" for sj, i in schema_idx.items())
+
+    raw = ""
+    try:
+        raw = await _astream_json(llm, [
+            ("system", SQL_BATCH_GENERATOR_PROMPT),
+            (
+                "human",
+                f"{schemas_block}\n\n"
+                "Requests (JSON):\n"
+                f"{orjson.dumps(batch_requests).decode('utf-8')}",
+            ),
+        ])
+        results = orjson.loads(_extract_json(raw.strip())).get("results") or []
+        by_idx = {int(r["idx"]): r for r in results if isinstance(r, dict) and "idx" in r}
+    except Exception:
+        logger.warning("Batched SQL generation failed, falling back to single calls. Raw:\n%s", raw)
+        by_idx = {}
+
+    out: List[Any] = [by_idx.get(i) for i in range(len(items))]
+    missing = [i for i, r in enumerate(out) if r is None]
+    if missing:
+        singles = await asyncio.gather(
+            *[_llm_generate_one(*items[i]) for i in missing],
+            return_exceptions=True,
+        )
+        for i, res in zip(missing, singles):
+            out[i] = res
+    for r in out:
+        if isinstance(r, dict):
+            r.pop("idx", None)
+    return out
+
+
+# one batcher per model config: only identical models can share a call.
+# Only structured SQL generation is batched; free-form chat never goes through here.
+_GEN_BATCHERS: Dict[str, LLMBatcher[_GenItem, Dict[str, Any]]] = {}
+
+
+def _get_gen_batcher(llm: Any) -> LLMBatcher[_GenItem, Dict[str, Any]]:
+    key = _llm_cache_id(llm)
+    batcher = _GEN_BATCHERS.get(key)
+    if batcher is None:
+        batcher = _GEN_BATCHERS[key] = LLMBatcher(
+            _llm_generate_batch,
+            window_s=settings.SQL_GEN_BATCH_WINDOW_MS / 1000,
+            max_batch=settings.SQL_GEN_BATCH_MAX_SIZE,
+        )
+    return batcher
+
+
 async def _llm_fix(
     llm: BaseChatModel,
     user_text: str,
@@ -77,9 +213,12 @@ async def _llm_fix(
     attempts: List[Dict[str, Any]],
     attempts_summary: Optional[str] = None,
     attempts_transcript: Optional[str] = None,
+    hint: Optional[str] = None,
+    schema_json: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Fixes SQL using full retry history (attempts) so the model doesn't repeat mistakes.
+    `hint` is an extra fix strategy appended to the instructions.
 
     Returns STRICT JSON:
       {"sql": "...", "fix_notes": "...", ...optional fields...}
@@ -90,15 +229,15 @@ async def _llm_fix(
     if attempts_transcript is None:
         attempts_transcript = build_attempts_transcript(attempts)
 
-    # Важно: схема может быть большой — не вываливаем слишком огромный JSON без нужды.
-    # Но если schema_context у тебя уже "RAG-compact", оставляем как есть.
-    schema_json = json.dumps(schema_context, ensure_ascii=False)
+    # Важно: схема может быть большой — сюда приходит уже compact_for_prompt().
+    if schema_json is None:
+        schema_json = _canonical_json(schema_context)
 
     human_prompt = (
-        "User request:\n"
-        f"{user_text}\n\n"
         "Schema context (JSON):\n"
         f"{schema_json}\n\n"
+        "User request:\n"
+        f"{user_text}\n\n"
         "Previous SQL (the one that failed):\n"
         f"{prev_sql}\n\n"
         "Database error:\n"
@@ -114,22 +253,25 @@ async def _llm_fix(
         "- If you see timeouts in attempts, make the query more selective:\n"
         "  add filters, reduce joins, narrow time range, pre-aggregate, avoid full scans.\n"
         "- Keep aliases consistent and use only tables/columns that exist in schema context.\n"
-        "Return JSON with at least keys: sql, fix_notes.\n"
     )
+    if hint:
+        human_prompt += f"- {hint}\n"
+    human_prompt += "Return JSON with at least keys: sql, fix_notes.\n"
 
-    res = await llm.ainvoke(
+    raw = await _astream_json(
+        llm,
         [
-            SystemMessage(content=SQL_FIXER_PROMPT),
-            HumanMessage(content=human_prompt),
-        ]
+            ("system", SQL_FIXER_PROMPT),
+            ("human", human_prompt),
+        ],
     )
 
-    raw = (res.content or "").strip()
+    raw = raw.strip()
     clean = _extract_json(raw)
 
     try:
-        parsed = json.loads(clean)
-    except json.JSONDecodeError as e:
+        parsed = orjson.loads(clean)
+    except orjson.JSONDecodeError as e:
         raise ValueError(f"SQL fixer returned invalid JSON.\nRaw:\n{raw}") from e
 
     # мягкая валидация результата
@@ -149,100 +291,146 @@ async def _llm_fix(
     return parsed
 
 
+async def _llm_fix_many(
+    llm: BaseChatModel,
+    user_text: str,
+    schema_context: Dict[str, Any],
+    prev_sql: str,
+    error_text: str,
+    *,
+    attempts: List[Attempt],
+    k: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    Runs `k` fixer calls concurrently, each with a different fix strategy.
 
+    Returns the distinct SELECT-only candidates (each one a `_llm_fix` result with
+    a normalized "sql"). Raises the first fixer error if every call failed.
+    """
+    attempts_summary = build_attempts_summary(attempts)
+    attempts_transcript = build_attempts_transcript(attempts)
+    schema_json = _canonical_json(schema_context)
+
+    hints: List[Optional[str]] = [None] if k <= 1 else [
+        _FIX_STRATEGIES[i % len(_FIX_STRATEGIES)] for i in range(k)
+    ]
+    results = await asyncio.gather(
+        *[
+            _llm_fix(
+                llm,
+                user_text,
+                schema_context,
+                prev_sql,
+                error_text,
+                attempts=attempts,
+                attempts_summary=attempts_summary,
+                attempts_transcript=attempts_transcript,
+                hint=hint,
+                schema_json=schema_json,
+            )
+            for hint in hints
+        ],
+        return_exceptions=True,
+    )
 
-class Attempt(TypedDict, total=False):
-    sql: str
-    error: str
-    error_type: str
-    fix_notes: str
-
+    candidates: List[Dict[str, Any]] = []
+    seen: set[bytes] = set()  # same fingerprint as execute_with_retries: case/whitespace variants are one SQL
+    errors: List[BaseException] = []
+    for res in results:
+        if isinstance(res, BaseException):
+            logger.warning("SQL fixer call failed: %s", res)
+            errors.append(res)
+            continue
+        sql = fix_quoted_schema_table(res["sql"])
+        fp = _sql_fingerprint(sql)
+        if fp in seen or not _is_select_only(sql):
+            continue
+        seen.add(fp)
+        res["sql"] = sql
+        candidates.append(res)
+
+    if not candidates and errors and len(errors) == len(results):
+        raise errors[0]
+    return candidates
+
+
+async def _run_sql_async(
+    sql: str,
+    limit: int,
+    cancel: Optional[QueryCancel] = None,
+) -> Tuple[str, Optional[List[Dict[str, Any]]], Optional[Exception]]:
+    try:
+        return sql, await asyncio.to_thread(run_sql, sql, limit=limit, cancel=cancel), None
+    except Exception as e:
+        return sql, None, e
 
-def classify_error(err: str) -> str:
-    e = (err or "").lower()
 
-    # timeout
-    if "timeout" in e or "statement timeout" in e or "canceling statement due to statement timeout" in e:
-        return "timeout"
+async def _run_first_ok(
+    sqls: List[str],
+    limit: int,
+) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]], List[Tuple[str, Exception]], List[str]]:
+    """
+    Executes candidate SQLs concurrently and returns on the first success.
 
-    # common postgres-ish
-    if "does not exist" in e and "column" in e:
-        return "missing_column"
-    if "does not exist" in e and ("relation" in e or "table" in e):
-        return "missing_table"
-    if "syntax error" in e:
-        return "syntax"
-    if "invalid input syntax" in e or "cannot cast" in e or "type mismatch" in e:
-        return "type"
-    if "permission denied" in e:
-        return "permission"
+    Returns (sql, rows, failures, cancelled). `sql`/`rows` are None if every
+    candidate failed. Queries that were still running when another one
+    succeeded are cancelled on the server and reported in `cancelled`.
+    """
+    cancels = {s: QueryCancel() for s in sqls}
+    tasks = [asyncio.ensure_future(_run_sql_async(s, limit, cancels[s])) for s in sqls]
+    failures: List[Tuple[str, Exception]] = []
+    finished: set[str] = set()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            sql, rows, err = await next_done
+            finished.add(sql)
+            if err is None:
+                return sql, rows, failures, [s for s in sqls if s not in finished]
+            failures.append((sql, err))
+        return None, None, failures, []
+    finally:
+        loop = asyncio.get_running_loop()
+        for s, t in zip(sqls, tasks):
+            t.cancel()
+            if s not in finished:
+                # conn.cancel() blocks on the network: send it from a worker thread
+                loop.run_in_executor(None, cancels[s].cancel)
 
-    return "other"
 
 
-def build_attempts_transcript(
-    attempts: List[Attempt],
-    *,
-    max_items: int = 5,
-    max_sql_chars: int = 1400,
-    max_err_chars: int = 800,
-    max_notes_chars: int = 600,
-) -> str:
-    """
-    Compact transcript to feed the LLM. Uses only last `max_items` attempts.
-    """
-    if not attempts:
-        return "(none)"
-
-    tail = attempts[-max_items:]
-    start_idx = len(attempts) - len(tail) + 1
-
-    blocks: List[str] = []
-    for i, a in enumerate(tail, start=start_idx):
-        sql = (a.get("sql") or "")[:max_sql_chars]
-        err = (a.get("error") or "")[:max_err_chars]
-        et = a.get("error_type") or "unknown"
-        notes = (a.get("fix_notes") or "")[:max_notes_chars]
-
-        block = (
-            f"ATTEMPT #{i}\n"
-            f"ERROR_TYPE: {et}\n"
-            f"SQL:\n{sql}\n\n"
-            f"ERROR:\n{err}\n"
-        )
-        if notes:
-            block += f"\nFIX_NOTES:\n{notes}\n"
-        blocks.append(block)
 
-    return "\n\n---\n\n".join(blocks)
+def _discard_task(task: asyncio.Task) -> None:
+    # cancel, and retrieve a late exception so asyncio doesn't log
+    # "Task exception was never retrieved"
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
 
-def build_attempts_summary(attempts: List[Attempt], *, max_items: int = 10) -> str:
+def _record_failures(
+    attempts: List[Attempt],
+    failures: List[Tuple[str, Exception]],
+    fix_notes: Dict[str, str],
+) -> Tuple[bool, bool]:
     """
-    Very short summary, good to include along transcript to reduce repetition.
+    Appends failed candidates to `attempts`.
+    Returns (timed_out, fixable) for the round.
     """
-    if not attempts:
-        return "(none)"
-
-    tail = attempts[-max_items:]
-    start_idx = len(attempts) - len(tail) + 1
-
-    lines: List[str] = []
-    for i, a in enumerate(tail, start=start_idx):
-        et = a.get("error_type") or "unknown"
-        err = (a.get("error") or "").replace("\n", " ").strip()
-        if len(err) > 140:
-            err = err[:140] + "…"
-        lines.append(f"- #{i}: {et} | {err}")
-    return "\n".join(lines)
-
-_SCHEMA_DOT_TABLE_IN_QUOTES = re.compile(
-    r'"([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)"'  # "public.FlightSchedules"
-)
-
-def fix_quoted_schema_table(sql: str) -> str:
-    # "public.FlightSchedules" -> "public"."FlightSchedules"
-    return _SCHEMA_DOT_TABLE_IN_QUOTES.sub(r'"\1"."\2"', sql)
+    timed_out = False
+    fixable = False
+    for failed_sql, e in failures:
+        if isinstance(e, DBTimeoutError):
+            err, et = str(e), "timeout"
+            timed_out = True
+        else:
+            err, state = format_pg_error_with_sqlstate(e)
+            et, et_fixable = categorize_error(err, state)
+            fixable = fixable or et_fixable
+
+        attempt: Attempt = {"sql": failed_sql, "error": err, "error_type": et}
+        if fix_notes.get(failed_sql):
+            attempt["fix_notes"] = fix_notes[failed_sql]
+        attempts.append(attempt)
+    return timed_out, fixable
 
 
 async def execute_with_retries(
@@ -252,8 +440,20 @@ async def execute_with_retries(
     max_attempts: int = 5,
     preview_limit: int = 10,
     max_timeouts: int = 2,
+    fix_candidates: int = 3,
+    speculative_fix: bool = False,
 ) -> Dict[str, Any]:
     """
+    Each round executes the current candidate SQLs concurrently and returns on
+    the first success. If all of them fail with a fixable error, the fixer is
+    called `fix_candidates` times in parallel to produce the next round.
+
+    With `speculative_fix`, a "more selective" fix is requested while the SQL
+    is still running; it is used if the round times out and cancelled otherwise.
+
+    The SQL that succeeded is cached per (model, user_text, schema) and reused
+    instead of the generator next time; a cached SQL that fails is evicted.
+
     Returns:
     {
       "ok": bool,
@@ -266,86 +466,136 @@ async def execute_with_retries(
     attempts: List[Attempt] = []
     timeouts = 0
 
-    gen = await _llm_generate(llm, user_text, schema_context)
+    schema_json = _canonical_json(schema_context)
+    cache_key = _gen_cache_key(llm, user_text, schema_json)
+    # taken out of the cache while it runs: put back only if it succeeds again
+    gen = _GEN_CACHE.pop(cache_key, None)
+    if gen is None:
+        gen = await _llm_generate(llm, user_text, schema_context, schema_json=schema_json)
 
     sql = gen.get("sql_preview") or gen.get("sql") or gen.get("sql_full") or ""
     sql = fix_quoted_schema_table(sql)
     if not sql.strip():
         return {"ok": False, "error": "LLM returned empty SQL.", "attempts": attempts}
 
-    for _ in range(max_attempts):
-        if not _is_select_only(sql):
+    candidates: List[str] = [sql]
+    fix_notes: Dict[str, str] = {}
+    seen: set[bytes] = set()  # fingerprints of every SQL already executed
+
+    for round_no in range(max_attempts):
+        if not candidates or not all(_is_select_only(c) for c in candidates):
             return {
                 "ok": False,
                 "error": "Refused: only SELECT or WITH queries are allowed.",
                 "attempts": attempts,
             }
 
+        # prefetch only if a timeout this round would still leave a retry
+        spec_task: Optional[asyncio.Task] = None
+        if speculative_fix and round_no + 1 < max_attempts and timeouts + 1 < max_timeouts:
+            spec_task = asyncio.create_task(_llm_fix_many(
+                llm,
+                user_text,
+                schema_context,
+                candidates[0],
+                "(not finished yet) Assume this query exceeds the statement timeout.",
+                attempts=list(attempts),
+                k=1,  # usually thrown away: one fixer call is enough
+            ))
+
+        seen.update(map(_sql_fingerprint, candidates))
         try:
-            rows = run_sql(sql, limit=preview_limit)
+            ok_sql, rows, failures, cancelled = await _run_first_ok(candidates, preview_limit)
+        except BaseException:
+            if spec_task is not None:
+                _discard_task(spec_task)
+            raise
+
+        if ok_sql is not None:
+            if spec_task is not None:
+                _discard_task(spec_task)
+            # keep the candidates that failed or lost in history
+            _record_failures(attempts, failures, fix_notes)
+            for s in cancelled:
+                attempts.append({
+                    "sql": s,
+                    "error": "Cancelled: another candidate succeeded first.",
+                    "error_type": "cancelled",
+                    "fix_notes": fix_notes.get(s, ""),
+                })
+            _GEN_CACHE[cache_key] = {"sql": ok_sql}
+            if len(_GEN_CACHE) > _GEN_CACHE_MAX:
+                _GEN_CACHE.popitem(last=False)
             return {
                 "ok": True,
-                "sql": sql,
+                "sql": ok_sql,
                 "rows_preview": rows[:10],
                 "attempts": attempts,
             }
 
-        except DBTimeoutError as e:
-            timeouts += 1
-            err = str(e)
+        timed_out, fixable = _record_failures(attempts, failures, fix_notes)
 
-            attempt: Attempt = {
-                "sql": sql,
-                "error": err,
-                "error_type": "timeout",
-            }
-            attempts.append(attempt)
+        fixes: Optional[List[Dict[str, Any]]] = None
+        if spec_task is not None:
+            if timed_out:
+                try:
+                    fixes = await spec_task or None
+                except Exception:
+                    logger.warning("Speculative SQL fix failed; retrying with the real error", exc_info=True)
+            else:
+                _discard_task(spec_task)
 
+        if timed_out:
+            timeouts += 1
             if timeouts >= max_timeouts:
                 return {
                     "ok": False,
                     "error": "Query timed out. Please narrow filters or time range.",
                     "attempts": attempts,
                 }
+        elif not fixable:
+            return {
+                "ok": False,
+                "error": attempts[-1]["error"],
+                "attempts": attempts,
+            }
 
-            fixed = await _llm_fix(
-                llm=llm,
-                user_text=user_text,
-                schema_context=schema_context,
-                sql=sql,
-                err=err,
+        if fixes is None:
+            fixes = await _llm_fix_many(
+                llm,
+                user_text,
+                schema_context,
+                attempts[-1]["sql"],
+                attempts[-1]["error"],
                 attempts=attempts,  # <-- whole history (tail used in prompt)
-                attempts_summary=build_attempts_summary(attempts),
-                attempts_transcript=build_attempts_transcript(attempts),
+                k=fix_candidates,
             )
-            sql = fixed.get("sql") or sql
-            attempts[-1]["fix_notes"] = fixed.get("fix_notes", "")
-
-        except Exception as e:
-            err = format_pg_error(e)
-            et = classify_error(err)
-
-            attempts.append({"sql": sql, "error": err, "error_type": et})
-
-            if is_llm_fixable_sql_error(e) or et in {"missing_column", "missing_table", "syntax", "type"}:
-                fixed = await _llm_fix(
-                    llm=llm,
-                    user_text=user_text,
-                    schema_context=schema_context,
-                    sql=sql,
-                    err=err,
-                    attempts=attempts,
-                    attempts_summary=build_attempts_summary(attempts),
-                    attempts_transcript=build_attempts_transcript(attempts),
-                )
-                sql = fixed.get("sql") or sql
-                attempts[-1]["fix_notes"] = fixed.get("fix_notes", "")
-            else:
+
+        # the fixer repeated an SQL that already failed: ask once more, then give up
+        fresh = [f for f in fixes if _sql_fingerprint(f["sql"]) not in seen]
+        if fixes and not fresh:
+            fixes = await _llm_fix_many(
+                llm,
+                user_text,
+                schema_context,
+                attempts[-1]["sql"],
+                attempts[-1]["error"]
+                + "\n\nNOTE: your previous fix repeated an SQL that was already tried. "
+                "The new SQL MUST differ from every previous attempt.",
+                attempts=attempts,
+                k=fix_candidates,
+            )
+            fresh = [f for f in fixes if _sql_fingerprint(f["sql"]) not in seen]
+            if fixes and not fresh:
                 return {
                     "ok": False,
-                    "error": err,
+                    "error": "LLM looped on identical SQL.",
                     "attempts": attempts,
                 }
+        fixes = fresh
+
+        candidates = [f["sql"] for f in fixes]
+        fix_notes = {f["sql"]: f.get("fix_notes", "") for f in fixes}
 
     return {
         "ok": False,
@@ -356,20 +606,10 @@ async def execute_with_retries(
 
 
 
-
 def is_llm_fixable_sql_error(e: Exception) -> bool:
     """
     True if the error is likely caused by invalid SQL and can be fixed by rewriting it.
     """
     if isinstance(e, PsycopgError) and getattr(e, "sqlstate", None):
-        return e.sqlstate[:2] in {
-            "42",  # syntax error, undefined table/column
-            "22",  # invalid input / type mismatch
-            "23",  # constraint violation
-        }
+        return e.sqlstate[:2] in _FIXABLE_SQLSTATE_CLASSES
     return False
-
-
-
-
-
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional
 import httpx
+import orjson
 import requests
 import logging
 
@@ -8,6 +9,51 @@ class RagDBServiceError(RuntimeError):
     pass
 
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# один клиент на процесс: переиспользуем TCP/TLS-соединения (keep-alive) между запросами
+_rag_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_rag_client() -> httpx.AsyncClient:
+    global _rag_client
+    if _rag_client is None or _rag_client.is_closed:
+        _rag_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _rag_client
+
+
+async def aclose_rag_client() -> None:
+    """
+    Closes the shared RagDBService client (call on app shutdown).
+    """
+    global _rag_client
+    if _rag_client is not None:
+        await _rag_client.aclose()
+        _rag_client = None
+
+
+def _schema_from_response(r: Any) -> Dict[str, Any]:
+    # r: requests.Response | httpx.Response
+    if r.status_code != 200:
+        raise RagDBServiceError(f"RagDBService HTTP {r.status_code}: {r.text[:500]}")
+
+    try:
+        payload = orjson.loads(r.content)
+    except ValueError as e:
+        raise RagDBServiceError(f"RagDBService returned non-JSON: {r.text[:500]}") from e
+
+    if not payload.get("ok"):
+        raise RagDBServiceError(payload.get("error") or "RagDBService returned ok=false")
+
+    schema = payload.get("schema")
+    if not isinstance(schema, dict) or "tables" not in schema:
+        raise RagDBServiceError(f"RagDBService response has no schema: {payload}")
+
+    return schema
+
 
 def build_schema_context_via_ragdb(
     analysis: Dict[str, Any],
@@ -18,6 +64,7 @@ def build_schema_context_via_ragdb(
 ) -> Dict[str, Any]:
     """
     Замена старого build_schema_context(chroma, analysis).
+    Блокирующий вариант; в async-коде используйте build_schema_context_via_ragdb_async.
 
     Возвращает dict в формате:
       {
@@ -34,29 +81,38 @@ def build_schema_context_via_ragdb(
     try:
         s = requests.Session()
         #s.trust_env = False  # не использовать HTTP(S)_PROXY из окружения
-        r = s.post(url, json=analysis, timeout=timeout)
+        r = s.post(url, data=orjson.dumps(analysis), headers=_JSON_HEADERS, timeout=timeout)
         r.raise_for_status()
     except requests.RequestException as e:
         raise RagDBServiceError(f"RagDBService request failed: {e}") from e
 
+    return _schema_from_response(r)
 
 
-    if r.status_code != 200:
-        raise RagDBServiceError(f"RagDBService HTTP {r.status_code}: {r.text[:500]}")
+async def build_schema_context_via_ragdb_async(
+    analysis: Dict[str, Any],
+    *,
+    base_url: str = "http://127.0.0.1:8000",
+    endpoint: str = "/schema",
+    timeout: float = 15.0,
+) -> Dict[str, Any]:
+    """
+    Async version of build_schema_context_via_ragdb on the shared httpx client:
+    doesn't block the event loop and reuses pooled connections.
+    """
+    logger = logging.getLogger("orchestrator")
+    url = base_url.rstrip("/") + endpoint
+    logger.info("RAG URL raw=%r", url)
 
     try:
-        payload = r.json()
-    except ValueError as e:
-        raise RagDBServiceError(f"RagDBService returned non-JSON: {r.text[:500]}") from e
-
-    if not payload.get("ok"):
-        raise RagDBServiceError(payload.get("error") or "RagDBService returned ok=false")
-
-    schema = payload.get("schema")
-    if not isinstance(schema, dict) or "tables" not in schema:
-        raise RagDBServiceError(f"RagDBService response has no schema: {payload}")
+        r = await _get_rag_client().post(
+            url, content=orjson.dumps(analysis), headers=_JSON_HEADERS, timeout=timeout,
+        )
+        r.raise_for_status()
+    except httpx.HTTPError as e:
+        raise RagDBServiceError(f"RagDBService request failed: {e}") from e
 
-    return schema
+    return _schema_from_response(r)
 
 
 async def ingest_sql_history(
@@ -92,17 +148,18 @@ async def ingest_sql_history(
 
     try:
         timeout = httpx.Timeout(timeout_s)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
+        resp = await _get_rag_client().post(
+            url, content=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=timeout,
+        )
+        resp.raise_for_status()
 
-            # If service returns JSON
-            ctype = resp.headers.get("content-type", "")
-            if "application/json" in ctype:
-                return resp.json()
+        # If service returns JSON
+        ctype = resp.headers.get("content-type", "")
+        if "application/json" in ctype:
+            return orjson.loads(resp.content)
 
-            # Fallback: return text
-            return {"ok": True, "status_code": resp.status_code, "text": resp.text}
+        # Fallback: return text
+        return {"ok": True, "status_code": resp.status_code, "text": resp.text}
 
     except (httpx.TimeoutException, httpx.HTTPError) as e:
         raise RagDBServiceError(f"History ingest failed: {e}") from e
@@ -142,15 +199,16 @@ async def search_sql_history(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=timeout_s) as client:
-            resp = await client.post(url, json=payload)
+        resp = await _get_rag_client().post(
+            url, content=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=timeout_s,
+        )
 
         if resp.status_code != 200:
             raise RagDBServiceError(
                 f"RAG history search failed: {resp.status_code} {resp.text}"
             )
 
-        data = resp.json()
+        data = orjson.loads(resp.content)
         if not data.get("ok"):
             return []
 
@@ -24,9 +24,14 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
-from RAG.chroma_store import ChromaStore
+from typing import TYPE_CHECKING
 import logging
 
+if TYPE_CHECKING:
+    # только для аннотаций: chroma_store тянет chromadb/transformers,
+    # а compact_for_prompt без них должен импортироваться
+    from RAG.chroma_store import ChromaStore
+
 
 
 @dataclass
@@ -232,44 +237,103 @@ def build_schema_context(
     return schema_context
 
 
-def compact_for_prompt(schema_context: Dict[str, Any]) -> Dict[str, Any]:
+# поля таблицы, которые идут в промпт (кроме name/columns/FK); пустые пропускаем
+_PROMPT_TABLE_KEYS = ("summary", "description")
+
+
+def _fk_target_table(fk: Any) -> str:
+    to = fk.get("to", "") if isinstance(fk, dict) else str(fk).rpartition("->")[2]
+    return str(to).strip().rsplit(".", 1)[0]
+
+
+def _fk_str(fk: Any) -> str:
+    if isinstance(fk, dict):
+        return f'{fk.get("from", "")} -> {fk.get("to", "")}'
+    return str(fk)
+
+
+def compact_for_prompt(
+    schema_context: Dict[str, Any],
+    *,
+    max_fks_per_table: int = 20,
+    column_docs: bool = False,
+) -> Dict[str, Any]:
+    """
+    Token-lean copy of schema_context for LLM prompts:
+    - per table only name, non-empty summary/description, columns and FKs
+    - columns as names (from "name" or "column_name"), plus a parallel "types"
+      array only if some column has a type; column docs only with `column_docs`
+    - FKs as "from -> to" strings, capped per table (most referenced tables first)
+    - "relationships" keeps only FKs not already listed under a table
+    """
     tables_out = []
+    listed_fks: set[str] = set()
 
     try:
         tables = schema_context.get("tables", {})
         # поддержка и list, и dict
         if isinstance(tables, dict):
-            iterable = tables.values()
+            iterable = list(tables.values())
         else:
-            iterable = tables
+            iterable = list(tables)
+
+        # чаще всего упоминаемые таблицы — первыми в списке FK
+        target_freq: Dict[str, int] = {}
+        all_fks = [fk for t in iterable if isinstance(t, dict) for fk in (t.get("foreign_keys_outgoing") or [])]
+        for fk in all_fks + list(schema_context.get("relationships") or []):
+            target = _fk_target_table(fk)
+            target_freq[target] = target_freq.get(target, 0) + 1
 
         for t in iterable:
             try:
-                columns = []
+                out: Dict[str, Any] = {"name": f'{t.get("schema","")}.{t.get("name","")}'.strip(".")}
+                for k in _PROMPT_TABLE_KEYS:
+                    if t.get(k):
+                        out[k] = t[k]
+
+                names: List[str] = []
+                types: List[str] = []
+                docs: List[str] = []
                 for c in (t.get("columns") or []):
-                    # кладём ТОЛЬКО имя колонки
-                    col_name = c.get("name")
-                    if col_name:
-                        columns.append(col_name)
-
-                tables_out.append({
-                    "name": f'{t.get("schema","")}.{t.get("name","")}'.strip("."),
-                    "description": t.get("description", ""),
-                    "summary": t.get("summary", ""),
-                    "columns": columns,
-                    "foreign_keys_outgoing": t.get("foreign_keys_outgoing", []),
-                })
+                    if not isinstance(c, dict):
+                        c = {"name": c}
+                    col_name = c.get("name") or c.get("column_name")
+                    if not col_name:
+                        continue
+                    # имя колонки; тип и doc — только если есть / запрошены
+                    names.append(str(col_name))
+                    types.append(_safe_str(c.get("type") or c.get("data_type")))
+                    if column_docs:
+                        docs.append(_safe_str(c.get("doc") or c.get("description")))
+                if names:
+                    out["columns"] = names
+                if any(types):
+                    out["types"] = types
+                if any(docs):
+                    out["docs"] = docs
+
+                fks = sorted(
+                    t.get("foreign_keys_outgoing") or [],
+                    key=lambda fk: -target_freq.get(_fk_target_table(fk), 0),
+                )
+                # обрезанные FK тоже считаются показанными: не дублируем их в relationships
+                listed_fks.update(map(_fk_str, fks))
+                if fks:
+                    out["foreign_keys_outgoing"] = [_fk_str(fk) for fk in fks[:max_fks_per_table]]
+                tables_out.append(out)
             except Exception:
                 # пропускаем одну кривую таблицу, но не валим весь запрос
                 continue
 
+        relationships = [
+            r for r in map(_fk_str, schema_context.get("relationships") or []) if r not in listed_fks
+        ]
+
     except Exception:
         # вообще что-то пошло не так
         return {"tables": [], "relationships": []}
 
     return {
         "tables": tables_out,
-        "relationships": schema_context.get("relationships", []),
+        "relationships": relationships,
     }
-
-
@@ -6,6 +6,8 @@ from  API.history import history_router
 from  API.ui import ui_router
 from API.config import config_router
 from observability.metrics import metrics_router
+from RAG.rag_service import aclose_rag_client
+from DB.executor import open_pool, close_pool
 #from RAG.chroma_store import ChromaStore
 #from API.config import settings
 
@@ -32,6 +34,17 @@ app.include_router(metrics_router, tags=["metrics"])
 #         app.state.chroma.rebuild()
 
 
+@app.on_event("startup")
+def startup_db_pool():
+    open_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await aclose_rag_client()
+    close_pool()
+
+
 app.include_router(ui_router)
 
 if __name__ == "__main__":
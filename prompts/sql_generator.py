@@ -32,3 +32,20 @@ Additional rules:
 - If time or range is not specified, assume a reasonable default.
 """
 
+
+SQL_BATCH_GENERATOR_PROMPT = SQL_GENERATOR_PROMPT + """
+BATCH MODE:
+You receive several independent user requests at once. Each request refers to
+one of the numbered schema_context blocks via "schema_idx" and may use ONLY
+that schema. Solve every request separately, following all rules above.
+
+Instead of a single object, return STRICT JSON only:
+
+{
+  "results": [
+    {"idx": 0, "sql_preview": "...", "sql_full": "...", "notes": "..."}
+  ]
+}
+
+Include exactly one result per request, with the request's "idx".
+"""
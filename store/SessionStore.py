@@ -1,20 +1,25 @@
 from __future__ import annotations
 
-from typing import Dict, List, Tuple, Optional, Literal, Any
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple, Optional, Literal, Any, Sequence
 from uuid import uuid4
 
 from pydantic import BaseModel
 # from langchain_core.messages import BaseMessage  # если используете langchain
 BaseMessage = object  # заглушка для примера
 
+HISTORY_WINDOW = 80  # окно истории: сколько последних сообщений храним на ключ
+
 
 class SessionStore:
-    def __init__(self):
-        # ключ: (session_id, message_key) -> история сообщений
-        self._db: Dict[Tuple[str, str], List[BaseMessage]] = {}
-        # порядок создания "сессий" (на самом деле пар (session_id, message_key))
-        self._order: List[Tuple[str, str]] = []
+    def __init__(self, max_sessions: int = 10_000):
+        # ключ: (session_id, message_key) -> история сообщений.
+        # OrderedDict сам хранит порядок использования (LRU): последний ключ — самый свежий
+        self._db: "OrderedDict[Tuple[str, str], Deque[BaseMessage]]" = OrderedDict()
+        self._max_sessions = max_sessions
         self._state: Dict[str, Dict[str, Any]] = {}
+        # session_id -> сколько ключей этой сессии в _db (чтобы знать, когда чистить _state)
+        self._keys_per_session: Dict[str, int] = {}
 
     def get_state(
             self,
@@ -43,39 +48,49 @@ class SessionStore:
         return uuid4().hex
 
     def _touch_order(self, key: Tuple[str, str]) -> None:
-        # гарантируем, что key считается "последним"
-        if key in self._order:
-            self._order.remove(key)
-        self._order.append(key)
+        # гарантируем, что key считается "последним", O(1)
+        self._db.move_to_end(key)
+
+        # вытесняем самые старые истории сверх лимита, O(1) на ключ
+        while len(self._db) > self._max_sessions:
+            (old_session, _), _ = self._db.popitem(last=False)
+            session_key = str(old_session)
+            left = self._keys_per_session.pop(session_key, 1) - 1
+            if left > 0:
+                self._keys_per_session[session_key] = left
+            else:
+                # вытеснен последний ключ сессии — её state больше не нужен
+                self._state.pop(session_key, None)
 
     def get_last_key(self) -> Optional[Tuple[str, str]]:
-        return self._order[-1] if self._order else None
+        return next(reversed(self._db), None)
 
-    def get_history(
+    def get_history_view(
             self,
             session_id: Optional[str],
-            message_key: str,
-    ) -> List[BaseMessage]:
-
+            message_key: str = "chat",
+    ) -> Sequence[BaseMessage]:
+        """
+        Read-only snapshot (tuple) of the history. Use it when the caller only iterates.
+        """
         # если session_id None -> берём последнюю сессию
         if session_id is None:
-            last = self.get_last_key()
-            if last is None:
-                return []
-
-            # лениво инициализируем, если вдруг нет
-            if last not in self._db:
-                self._db[last] = []
-
-            return self._db[last].copy()
+            key = self.get_last_key()
+            if key is None:
+                return ()
+        else:
+            key = (session_id, message_key)
 
-        key = (session_id, message_key)
-
-        # лениво инициализируем историю
-        if key not in self._db:
-            self._db[key] = []
+        hist = self._db.get(key)
+        return tuple(hist) if hist else ()
 
-        return self._db[key].copy()
+    def get_history(
+            self,
+            session_id: Optional[str],
+            message_key: str = "chat",
+    ) -> List[BaseMessage]:
+        # изменяемая копия — для тех, кто её модифицирует или требует list
+        return list(self.get_history_view(session_id, message_key))
 
     def append_messages(
         self,
@@ -88,9 +103,12 @@ class SessionStore:
             session_id = self._make_session_id()
 
         key = (session_id, message_key)
-        hist = self._db.get(key, [])
-        hist.extend(messages)
-        self._db[key] = hist[-80:]  # окно истории
+        hist = self._db.get(key)
+        if hist is None:
+            hist = self._db[key] = deque(maxlen=HISTORY_WINDOW)
+            session_key = str(session_id)
+            self._keys_per_session[session_key] = self._keys_per_session.get(session_key, 0) + 1
+        hist.extend(messages)  # deque сам отбрасывает старые сообщения
         self._touch_order(key)
         return session_id
 
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from LLM.batcher import LLMBatcher
+
+
+def test_items_within_window_share_one_batch():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        return [i * 10 for i in items]
+
+    async def main():
+        batcher = LLMBatcher(run_batch, window_s=0.01, max_batch=8)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+
+    assert asyncio.run(main()) == [0, 10, 20]
+    assert batches == [[0, 1, 2]]
+
+
+def test_max_batch_splits():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        return list(items)
+
+    async def main():
+        batcher = LLMBatcher(run_batch, window_s=0.01, max_batch=2)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_exception_result_goes_to_its_caller_only():
+    async def run_batch(items):
+        return [ValueError(i) if i == 1 else i for i in items]
+
+    async def main():
+        batcher = LLMBatcher(run_batch, window_s=0.01)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    ok0, err, ok2 = asyncio.run(main())
+    assert (ok0, ok2) == (0, 2)
+    assert isinstance(err, ValueError)
+
+
+@pytest.mark.parametrize("run_batch_result", ["raise", "wrong_length"])
+def test_failed_batch_fails_every_item(run_batch_result):
+    async def run_batch(items):
+        if run_batch_result == "raise":
+            raise RuntimeError("llm down")
+        return items[:1]
+
+    async def main():
+        batcher = LLMBatcher(run_batch, window_s=0.01)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(2)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
@@ -0,0 +1,63 @@
+from RAG.schema_context import compact_for_prompt
+
+
+def _fk(src, dst):
+    return {"from": src, "to": dst, "constraint_name": "fk"}
+
+
+FLIGHTS = {
+    "name": "public.flights",
+    "summary": "Flights",
+    "description": "",
+    "stats": {"rows": 10_000},
+    "columns": [
+        {"column_name": "id", "doc": "integer, primary key"},
+        {"name": "carrier", "type": "text"},
+        {"doc": "no name: skipped"},
+    ],
+}
+
+
+def test_only_whitelisted_table_keys_and_column_names():
+    out = compact_for_prompt({
+        "tables": [FLIGHTS],
+        "retrieval_debug": {"selected_tables": []},
+    })
+
+    assert out == {
+        "tables": [{
+            "name": "public.flights",
+            "summary": "Flights",
+            "columns": ["id", "carrier"],
+            "types": ["", "text"],
+        }],
+        "relationships": [],
+    }
+
+
+def test_types_omitted_when_no_column_has_one():
+    out = compact_for_prompt({"tables": {"t": {"schema": "s", "name": "t", "columns": [{"name": "a"}, "b"]}}})
+
+    assert out["tables"] == [{"name": "s.t", "columns": ["a", "b"]}]
+
+
+def test_column_docs_behind_flag():
+    out = compact_for_prompt({"tables": [FLIGHTS]}, column_docs=True)
+
+    assert out["tables"][0]["docs"] == ["integer, primary key", ""]
+
+
+def test_fks_capped_and_not_repeated_in_relationships():
+    fks = [_fk("s.a.x_id", "s.x.id"), _fk("s.a.b_id", "s.b.id")]
+    ctx = {
+        "tables": {"a": {"schema": "s", "name": "a", "foreign_keys_outgoing": fks}},
+        "relationships": fks + [_fk("s.c.b_id", "s.b.id")],
+    }
+
+    out = compact_for_prompt(ctx, max_fks_per_table=1)
+
+    table = out["tables"][0]
+    assert table["name"] == "s.a"
+    # s.b is referenced most often, so its FK is kept
+    assert table["foreign_keys_outgoing"] == ["s.a.b_id -> s.b.id"]
+    assert out["relationships"] == ["s.c.b_id -> s.b.id"]
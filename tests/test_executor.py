@@ -0,0 +1,143 @@
+import threading
+from contextlib import contextmanager, nullcontext
+
+import pytest
+from psycopg.errors import QueryCanceled
+
+import DB.executor as executor
+from DB.executor import DBCancelledError, DBTimeoutError, QueryCancel
+
+
+class FakeConnection:
+    """cursor().execute() runs `query(conn)`; a blocking query can wait for cancel()."""
+
+    def __init__(self, query):
+        self.query = query
+        self.cancelled = threading.Event()
+        self.started = threading.Event()
+        self.executed = []
+
+    def pipeline(self):
+        return nullcontext()
+
+    def execute(self, sql, params=None):  # set_config(...)
+        pass
+
+    @contextmanager
+    def cursor(self, row_factory=None):
+        yield _Cursor(self)
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def execute(self, sql):
+        self._conn.executed.append(sql)
+        self._conn.started.set()
+        self._rows = self._conn.query(self._conn)
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakePool:
+    instances = 0
+
+    def __init__(self, conninfo, **kwargs):
+        FakePool.instances += 1
+        self.kwargs = kwargs
+        self.conn = None
+        self.closed = False
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakePool.instances = 0
+    monkeypatch.setattr(executor, "ConnectionPool", FakePool)
+    monkeypatch.setattr(executor, "_pool", None)
+    monkeypatch.setattr(executor.psycopg.Pipeline, "is_supported", staticmethod(lambda: False))
+    yield executor.open_pool()
+    executor.close_pool()
+
+
+def _use(pool, query):
+    pool.conn = FakeConnection(query)
+    return pool.conn
+
+
+def test_open_pool_is_idempotent(pool):
+    assert executor.open_pool() is pool
+    assert FakePool.instances == 1
+    assert pool.kwargs["open"] is False
+
+    executor.close_pool()
+    assert pool.closed
+    assert executor.open_pool() is not pool
+
+
+def test_run_sql_adds_limit(pool):
+    conn = _use(pool, lambda c: [{"a": 1}])
+
+    assert executor.run_sql("SELECT a FROM t;", limit=5) == [{"a": 1}]
+    assert conn.executed[-1] == "SELECT a FROM t LIMIT 5"
+
+
+def test_statement_timeout_raises_db_timeout(pool):
+    def query(conn):
+        raise QueryCanceled("canceling statement due to statement timeout")
+
+    _use(pool, query)
+
+    with pytest.raises(DBTimeoutError):
+        executor.run_sql("SELECT 1")
+
+
+def test_cancel_before_start_skips_query(pool):
+    conn = _use(pool, lambda c: pytest.fail("query must not run"))
+    cancel = QueryCancel()
+    cancel.cancel()
+
+    with pytest.raises(DBCancelledError):
+        executor.run_sql("SELECT 1", cancel=cancel)
+    assert conn.executed == []
+
+
+def test_cancel_running_query_on_server(pool):
+    def query(conn):
+        assert conn.cancelled.wait(5)
+        raise QueryCanceled("canceling statement due to user request")
+
+    conn = _use(pool, query)
+    cancel = QueryCancel()
+    errors = []
+
+    def worker():
+        try:
+            executor.run_sql("SELECT pg_sleep(10)", cancel=cancel)
+        except Exception as e:
+            errors.append(e)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    assert conn.started.wait(5)
+    cancel.cancel()
+    t.join(5)
+
+    assert not t.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], DBCancelledError)
+    assert cancel._conn is None  # detached before the connection went back to the pool
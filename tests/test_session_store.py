@@ -0,0 +1,35 @@
+from store.SessionStore import HISTORY_WINDOW, SessionStore
+
+
+def test_lru_evicts_least_recently_used_key():
+    store = SessionStore(max_sessions=2)
+    store.append_messages("a", "chat", ["a1"])
+    store.append_messages("b", "chat", ["b1"])
+    store.append_messages("a", "chat", ["a2"])  # "a" is now the freshest
+    store.append_messages("c", "chat", ["c1"])
+
+    assert store.get_history("b") == []
+    assert store.get_history("a") == ["a1", "a2"]
+    assert store.get_last_key() == ("c", "chat")
+    assert store.get_history_view(None) == ("c1",)
+
+
+def test_state_evicted_with_last_key_of_session():
+    store = SessionStore(max_sessions=2)
+    store.append_messages("a", "chat", [1])
+    store.append_messages("a", "sql", [1])
+    store.set_state("a", "last_sql", "SELECT 1")
+
+    store.append_messages("b", "chat", [1])  # evicts ("a", "chat"), "a" still has "sql"
+    assert store.get_state("a", "last_sql") == "SELECT 1"
+
+    store.append_messages("c", "chat", [1])  # evicts ("a", "sql")
+    assert store.get_state("a", "last_sql") is None
+
+
+def test_history_is_windowed():
+    store = SessionStore()
+    sid = store.append_messages(None, "chat", list(range(HISTORY_WINDOW + 5)))
+
+    assert store.get_history(sid) == list(range(5, HISTORY_WINDOW + 5))
+    assert isinstance(store.get_history_view(sid), tuple)
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+import LLM.sql_helpers as helpers
+from LLM.sql_helpers import _is_select_only, _sql_fingerprint, classify_error
+
+
+@pytest.fixture(params=["hyperscan", "re"])
+def scanner(request, monkeypatch):
+    # both banned-keyword scanners must agree
+    if request.param == "re":
+        monkeypatch.setattr(helpers, "_BANNED_HS", None)
+    elif helpers._BANNED_HS is None:
+        pytest.skip("hyperscan is not installed")
+    return _is_select_only
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM flights",
+    "  with x AS (SELECT 1) SELECT * FROM x",
+    "select updated_at, created_by from t",  # keywords inside identifiers
+    "SELECT 'кириллица' FROM t",
+    "SELECT a FROM t WHERE a = 'éinsert'",  # non-ASCII letter: still one word
+    "SELECT удалить_update FROM t",
+])
+def test_select_only_allows(scanner, sql):
+    assert scanner(sql) is True
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM flights",
+    "SELECT 1; DROP TABLE flights",
+    "WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d",
+    "select 1; Update t set a = 1",
+    "EXPLAIN SELECT 1",
+])
+def test_select_only_refuses(scanner, sql):
+    assert scanner(sql) is False
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    assert _sql_fingerprint(" SELECT a\n  FROM t") == _sql_fingerprint("select a from t")
+    assert _sql_fingerprint("SELECT a FROM t") != _sql_fingerprint("SELECT b FROM t")
+
+
+@pytest.mark.parametrize("err, expected", [
+    ("canceling statement due to statement timeout", "timeout"),
+    ('column "x" does not exist', "missing_column"),
+    ('relation "public.x" does not exist', "missing_table"),
+    ('syntax error at or near "FORM"', "syntax"),
+    ('invalid input syntax for type integer: "a"', "type"),
+    ("permission denied for table x", "permission"),
+    ("Column X Does Not Exist", "missing_column"),
+    ("", "other"),
+    (None, "other"),
+])
+def test_classify_error(err, expected):
+    assert classify_error(err) == expected
+
+
+def test_module_type_checks_for_mypyc():
+    # the Docker build compiles this module with mypyc: a type error fails the image build
+    api = pytest.importorskip("mypy.api")
+    path = Path(helpers.__file__).with_name("sql_helpers.py")
+    stdout, stderr, status = api.run(["--explicit-package-bases", "--no-incremental", str(path)])
+    assert status == 0, stdout + stderr
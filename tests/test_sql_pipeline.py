@@ -0,0 +1,184 @@
+import asyncio
+import json
+import time
+
+import pytest
+from psycopg.errors import AdminShutdown, UndefinedColumn
+
+import LLM.sql_pipeline as sp
+from DB.executor import DBCancelledError, DBTimeoutError
+from prompts.sql_generator import SQL_GENERATOR_PROMPT
+
+SCHEMA = {"tables": [{"name": "public.flights", "columns": ["id", "carrier"]}], "relationships": []}
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """
+    astream-only chat model. The generator answers `sql`; the fixer answers
+    fix(human_prompt) -> {"sql": ..., "fix_notes": ...}.
+    """
+    model_name = "fake"
+    temperature = 0.0
+
+    def __init__(self, sql, fix=None):
+        self.sql = sql
+        self.fix = fix
+        self.fix_prompts = []
+
+    async def astream(self, messages):
+        system, human = messages[0][1], messages[-1][1]
+        if system == SQL_GENERATOR_PROMPT:
+            payload = {"sql": self.sql}
+        else:
+            self.fix_prompts.append(human)
+            payload = self.fix(human)
+        text = json.dumps(payload)
+        yield _Chunk(text[:5])
+        yield _Chunk(text[5:])
+
+
+@pytest.fixture
+def run_sql(monkeypatch):
+    """
+    Replaces run_sql with a table: sql -> rows | exception | callable | "slow".
+    "slow" blocks until the query is cancelled.
+    """
+    results = {}
+    calls = []
+
+    def fake_run_sql(sql, limit=10, cancel=None):
+        calls.append(sql)
+        res = results[sql]
+        if res == "slow":
+            deadline = time.monotonic() + 5
+            while not cancel.cancelled and time.monotonic() < deadline:
+                time.sleep(0.005)
+            raise DBCancelledError("cancelled")
+        if isinstance(res, Exception):
+            raise res
+        return res() if callable(res) else res
+
+    monkeypatch.setattr(sp, "run_sql", fake_run_sql)
+    monkeypatch.setattr(sp, "_GEN_CACHE", type(sp._GEN_CACHE)())
+    fake_run_sql.results = results
+    fake_run_sql.calls = calls
+    return fake_run_sql
+
+
+def _run(llm, **kwargs):
+    return asyncio.run(sp.execute_with_retries(llm, "flights of SU", SCHEMA, **kwargs))
+
+
+def test_fix_then_succeed(run_sql):
+    run_sql.results["SELECT carier FROM flights"] = UndefinedColumn('column "carier" does not exist')
+    run_sql.results["SELECT carrier FROM flights"] = [{"carrier": "SU"}]
+    llm = FakeLLM(
+        "SELECT carier FROM flights",
+        fix=lambda _: {"sql": "SELECT carrier FROM flights", "fix_notes": "typo"},
+    )
+
+    res = _run(llm, fix_candidates=1)
+
+    assert res["ok"] is True
+    assert res["sql"] == "SELECT carrier FROM flights"
+    assert res["rows_preview"] == [{"carrier": "SU"}]
+    assert [a["error_type"] for a in res["attempts"]] == ["missing_column"]
+    assert "carier" in llm.fix_prompts[0]
+
+
+def test_losing_candidates_are_recorded(run_sql):
+    run_sql.results["SELECT bad FROM flights"] = UndefinedColumn('column "bad" does not exist')
+    run_sql.results["SELECT a FROM flights"] = UndefinedColumn('column "a" does not exist')
+    run_sql.results["SELECT b FROM flights"] = "slow"
+    # the winner finishes last among the fast ones, after "a" has failed
+    run_sql.results["SELECT c FROM flights"] = lambda: time.sleep(0.05) or [{"c": 1}]
+    fixes = iter(["SELECT a FROM flights", "SELECT b FROM flights", "SELECT c FROM flights"])
+    llm = FakeLLM("SELECT bad FROM flights", fix=lambda _: {"sql": next(fixes), "fix_notes": "n"})
+
+    res = _run(llm, fix_candidates=3)
+
+    assert res["ok"] is True
+    assert res["sql"] == "SELECT c FROM flights"
+    by_sql = {a["sql"]: a for a in res["attempts"]}
+    # the sibling that failed before the winner and the one still running are both kept
+    assert by_sql["SELECT a FROM flights"]["error_type"] == "missing_column"
+    assert by_sql["SELECT a FROM flights"]["fix_notes"] == "n"
+    assert by_sql["SELECT b FROM flights"]["error_type"] == "cancelled"
+
+
+def test_non_fixable_error_stops(run_sql):
+    run_sql.results["SELECT * FROM flights"] = AdminShutdown("terminating connection due to administrator command")
+    llm = FakeLLM("SELECT * FROM flights", fix=lambda _: pytest.fail("fixer must not be called"))
+
+    res = _run(llm)
+
+    assert res["ok"] is False
+    assert [a["error_type"] for a in res["attempts"]] == ["other"]
+    assert res["error"] == res["attempts"][-1]["error"]
+
+
+def test_generation_cached_only_after_success(run_sql):
+    run_sql.results["SELECT 1"] = [{"?column?": 1}]
+    llm = FakeLLM("SELECT 1")
+
+    assert _run(llm)["ok"] is True
+    assert len(sp._GEN_CACHE) == 1
+
+    llm.sql = "SELECT 2"  # not asked: the cached SQL is reused
+    assert _run(llm)["sql"] == "SELECT 1"
+
+    run_sql.results["SELECT 1"] = AdminShutdown("terminating connection")
+    assert _run(llm)["ok"] is False
+    assert len(sp._GEN_CACHE) == 0
+
+
+def test_timeout_uses_speculative_fix(run_sql):
+    run_sql.results["SELECT * FROM flights"] = DBTimeoutError("canceling statement due to statement timeout")
+    run_sql.results["SELECT * FROM flights WHERE carrier = 'SU'"] = [{"id": 1}]
+
+    def fix(prompt):
+        assert "(not finished yet)" in prompt
+        return {"sql": "SELECT * FROM flights WHERE carrier = 'SU'", "fix_notes": "selective"}
+
+    llm = FakeLLM("SELECT * FROM flights", fix=fix)
+
+    res = _run(llm, speculative_fix=True, max_timeouts=2, fix_candidates=3)
+
+    assert res["ok"] is True
+    assert res["sql"] == "SELECT * FROM flights WHERE carrier = 'SU'"
+    assert [a["error_type"] for a in res["attempts"]] == ["timeout"]
+    # prefetch is a single fixer call, and no second fixer round after the timeout
+    assert len(llm.fix_prompts) == 1
+
+
+def test_looped_identical_sql_gives_up(run_sql):
+    sql = "SELECT carier FROM flights"
+    run_sql.results[sql] = UndefinedColumn('column "carier" does not exist')
+    # fixer only changes whitespace/case: same fingerprint as the failed SQL
+    llm = FakeLLM(sql, fix=lambda _: {"sql": "select  carier from flights", "fix_notes": ""})
+
+    res = _run(llm, fix_candidates=1)
+
+    assert res["ok"] is False
+    assert res["error"] == "LLM looped on identical SQL."
+    assert len(llm.fix_prompts) == 2
+    assert "MUST differ" in llm.fix_prompts[1]
+    assert run_sql.calls == [sql]
+
+
+def test_fix_candidates_deduped_by_fingerprint(run_sql):
+    run_sql.results["SELECT carier FROM flights"] = UndefinedColumn('column "carier" does not exist')
+    run_sql.results["SELECT carrier FROM flights"] = [{"carrier": "SU"}]
+    variants = iter(["SELECT carrier FROM flights", "select  carrier\nfrom flights", "SELECT CARRIER FROM FLIGHTS"])
+    llm = FakeLLM("SELECT carier FROM flights", fix=lambda _: {"sql": next(variants), "fix_notes": ""})
+
+    res = _run(llm, fix_candidates=3)
+
+    assert res["ok"] is True
+    # case/whitespace variants run once: one pool connection, not three
+    assert run_sql.calls == ["SELECT carier FROM flights", "SELECT carrier FROM flights"]
@@ -15,7 +15,7 @@ from decimal import Decimal
 from API.config import settings
 from langchain_core.tools import tool
 from typing import Any, Dict
-from RAG.rag_service import build_schema_context_via_ragdb,ingest_sql_history,search_sql_history,RagDBServiceError
+from RAG.rag_service import build_schema_context_via_ragdb_async,ingest_sql_history,search_sql_history,RagDBServiceError
 
 
 import logging
@@ -108,9 +108,9 @@ async def conversation_chain(user_text: str, model: Optional[str] = None, temper
     """
     session_id = current_session_id.get()
     llm = make_llm(model, temperature)
-    history = session_store.get_history(session_id)
+    history = session_store.get_history_view(session_id)
 
-    prompt = [SystemMessage(content=SYSTEM_PROMPT)] + history + [HumanMessage(content=user_text)]
+    prompt = [SystemMessage(content=SYSTEM_PROMPT), *history, HumanMessage(content=user_text)]
     res = await llm.ainvoke(prompt)
     answer = res.content
 
@@ -267,7 +267,7 @@ async def db_query_chain(
     logger.info("analyzed query was executed")
 
 
-    schema_full = build_schema_context_via_ragdb(
+    schema_full = await build_schema_context_via_ragdb_async(
         analysis,
         base_url=settings.RAGDB_URL)
 
@@ -305,6 +305,7 @@ async def db_query_chain(
         user_text=user_text,
         schema_context=schema_for_prompt1,
         max_attempts=max_attempts,
+        speculative_fix=settings.SQL_SPECULATIVE_FIX,
     )
     logger.info("llm tryes to execute sql")
     # Persist last SQL for show_last_sql tool